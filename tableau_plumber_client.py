@@ -6,6 +6,8 @@ import os
 from tableauhyperapi import HyperProcess, Connection, TableDefinition, SqlType, Telemetry, Inserter, CreateMode, TableName
 from tableauhyperapi import escape_string_literal
 import json
+import copy
+from pandas.api.types import union_categoricals
 from tableauserverclient import server
 from tableauserverclient.models import tableau_auth
 
@@ -169,7 +171,195 @@ def getworkbookdata(all_items):
     consolelog('Workbook Data fetch completed')
     return itemtable
 
-def getitemdetails(item_type=None,conditions=req_option):
+# Column layout of every item_type. 'repeated' columns hold the same few values on many rows and
+# 'dates' columns are parsed to timestamps when a compact table is requested
+ITEM_COLUMNS = {
+    'project': {'columns': ['Item Name','Item ID'], 'repeated': [], 'dates': []},
+    'view': {'columns': ['Item Name','Item ID','Workbook ID'], 'repeated': ['Workbook ID'], 'dates': []},
+    'datasource': {'columns': ['Item Name','Item ID','Creation Date','Update Date','Project Name'], 'repeated': ['Project Name'], 'dates': ['Creation Date','Update Date']},
+    'workbook': {'columns': ['Item Name','Item ID','View Name','View ID'], 'repeated': ['Item Name','Item ID','View Name'], 'dates': []},
+}
+
+
+COMPACT_MODES = (None, 'category', 'arrow')
+
+
+def get_item_endpoint(item_type):
+    """
+    [summary]
+    Internal function that returns the server endpoint and the item data function of an item_type. This should not be called outside 'getitembatches' function
+    """
+
+    endpoints = {
+        'project': (server.projects, getprojectdata),
+        'workbook': (server.workbooks, getworkbookdata),
+        'view': (server.views, getviewdata),
+        'datasource': (server.datasources, getdatasourcedata),
+    }
+    return endpoints.get(item_type.lower(), (None, None))
+
+
+def compact_itemtable(itemtable,item_type,compact='category'):
+    """
+    [summary]
+    This converts an item dataframe to a smaller in-memory representation. Date columns are parsed to timestamps.
+
+    Args:
+        itemtable ([Dataframe]): Dataframe returned for the item_type
+
+        item_type ([string]): This can be 'Project','View','Workbook' or 'Datasource'
+
+        compact ([string], optional): 'category' turns repeated text columns into categoricals. 'arrow' stores every text column as an Arrow-backed string column and needs pyarrow. Defaults to 'category'.
+
+    Returns:
+        [Dataframe]: The converted dataframe
+    """
+
+    if compact not in ('category', 'arrow'):
+        raise ValueError(f"compact must be 'category' or 'arrow', not {compact!r}")
+
+    layout = ITEM_COLUMNS[item_type.lower()]
+    for col in layout['dates']:
+        itemtable[col] = pd.to_datetime(itemtable[col], utc=True, errors='coerce')
+
+    text_columns = [col for col in layout['columns'] if col not in layout['dates']]
+    if compact == 'arrow':
+        for col in text_columns:
+            itemtable[col] = itemtable[col].astype('string[pyarrow]')
+    else:
+        for col in layout['repeated']:
+            itemtable[col] = itemtable[col].astype('category')
+    return itemtable
+
+
+def concat_itemtables(itemtables,item_type):
+    """
+    [summary]
+    Internal function that joins page-sized item dataframes without turning categorical columns back into plain strings
+    """
+
+    columns = ITEM_COLUMNS[item_type.lower()]['columns']
+    if len(itemtables) == 0:
+        return pd.DataFrame(columns=columns)
+
+    # Empty pages carry no values and their untyped columns would clash with the filled pages
+    filled = [table for table in itemtables if len(table) > 0]
+    if len(filled) == 0:
+        return itemtables[0].reset_index(drop=True)
+
+    itemtable = {}
+    for col in columns:
+        parts = [table[col] for table in filled]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            itemtable[col] = union_categoricals(parts)
+        else:
+            itemtable[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(itemtable, columns=columns)
+
+
+def getitembatches(item_type=None,conditions=req_option,compact=None):
+    """
+    [summary]
+    Use this function to go through the details of the selected item_type page by page. Every page is yielded as a dataframe as soon as it arrives, so nothing waits for the full inventory to load.
+    Each page is fetched in its own sign in, so other functions of this module can be used between pages. If a page can't be fetched, the error is raised to the caller
+
+    Args:
+        item_type ([string], optional): This can be 'Project','View','Workbook' or 'Datasource'. Defaults to None.
+
+        compact ([string], optional): None, 'category' or 'arrow'. See compact_itemtable. Defaults to None.
+
+    Returns:
+        [generator]: Yields one dataframe per page of server items
+    """
+
+    endpoint, itemdata = get_item_endpoint(item_type or '')
+    if endpoint is None:
+        raise ValueError(f'Item type {item_type} is not supported')
+    if compact not in COMPACT_MODES:
+        raise ValueError(f"compact must be None, 'category' or 'arrow', not {compact!r}")
+
+    # Projects are fetched without the owner filter, same as getitemdetails
+    if item_type.lower() == 'project' or conditions is None:
+        conditions = TSC.RequestOptions()
+    else:
+        conditions = copy.copy(conditions)
+    return getitempages(endpoint, itemdata, item_type, conditions, compact)
+
+
+def getitempages(endpoint,itemdata,item_type,conditions,compact):
+    """
+    [summary]
+    Internal generator behind getitembatches. This should not be called outside 'getitembatches' function
+    """
+
+    consolelog(f'Streaming data for the tableau server item: {item_type}')
+    page_number = 0
+    item_count = 0
+    while True:
+        page_number += 1
+        conditions.pagenumber = page_number
+        # populate_views in getworkbookdata needs the session too, so the page is built before signing out
+        with server.auth.sign_in(tableau_auth):
+            page_items, pagination_item = endpoint.get(conditions)
+            if len(page_items) == 0:
+                break
+            item_count += len(page_items)
+            itemtable = itemdata(page_items)
+        if compact is not None:
+            itemtable = compact_itemtable(itemtable, item_type, compact)
+        consolelog(f'Page {page_number} fetched with {len(itemtable)} rows')
+        yield itemtable
+        # The server can return fewer items per page than requested, so the items are counted instead of the pages
+        if item_count >= pagination_item.total_available:
+            break
+    consolelog('Data Stream completed')
+
+
+def write_itemparquet(item_type,parquet_path,conditions=req_option):
+    """
+    [summary]
+    This writes the details of the selected item_type to a parquet file one page at a time, so only a single page is held in memory. Needs pyarrow.
+    If a page can't be fetched, the partly written file is removed
+
+    Args:
+        item_type ([string]): This can be 'Project','View','Workbook' or 'Datasource'
+
+        parquet_path ([string]): Full path of the parquet file including the extension
+
+    Returns:
+        [int]: Number of rows written. None if the export failed
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return consolelog('ERROR: pyarrow is required to write parquet files')
+
+    layout = ITEM_COLUMNS.get((item_type or '').lower())
+    if layout is None:
+        return consolelog(f'Item type {item_type} is not supported')
+
+    # A fixed schema keeps every page consistent even when a page has only empty dates
+    schema = pa.schema([(col, pa.timestamp('us', tz='UTC') if col in layout['dates'] else pa.string()) for col in layout['columns']])
+    row_count = 0
+    try:
+        with pq.ParquetWriter(parquet_path, schema) as writer:
+            for itemtable in getitembatches(item_type=item_type,conditions=conditions):
+                for col in layout['dates']:
+                    itemtable[col] = pd.to_datetime(itemtable[col], utc=True, errors='coerce')
+                writer.write_table(pa.Table.from_pandas(itemtable, schema=schema, preserve_index=False))
+                row_count += len(itemtable)
+    except Exception as e:
+        if os.path.exists(parquet_path):
+            os.remove(parquet_path)
+        return consolelog(f'ERROR: Parquet export failed because {e}')
+
+    consolelog(f'{row_count} rows written to {parquet_path}')
+    return row_count
+
+
+def getitemdetails(item_type=None,conditions=req_option,stream=False,compact=None,parquet_path=None):
 
     """
     Use this function to generate a dataframe containing details of the selected item_type. The item_type here can be PROJECT, WORKBOOK, DATASOURCE, VIEW
@@ -177,10 +367,35 @@ def getitemdetails(item_type=None,conditions=req_option):
     Args:
     item_type ([string], optional): Specify the item type here. This can be 'Project','View','Workbook' or 'Datasource'. Defaults to None.
 
+    stream ([bool], optional): If True, a generator yielding one dataframe per page is returned instead of a single dataframe. See getitembatches. Defaults to False.
+
+    compact ([string], optional): 'category' or 'arrow' to return a memory-lean dataframe with parsed dates. See compact_itemtable. Defaults to None.
+
+    parquet_path ([string], optional): If provided, the inventory is written page by page to this parquet file and the number of rows written is returned. Defaults to None.
+
+    The stream, compact and parquet_path options page through the whole inventory on the server. stream and compact can be used together but parquet_path can't be combined with either.
+
     Returns:
-        [Dataframe]
+        [Dataframe]: The item details. With stream=True a generator of page dataframes and with parquet_path the number of rows written. With any of these options, None if the item_type is not supported, the options don't fit together or the fetch failed
     """
 
+    if compact not in COMPACT_MODES:
+        return consolelog(f"ERROR: compact must be None, 'category' or 'arrow', not {compact!r}")
+    if parquet_path is not None and (stream or compact is not None):
+        return consolelog('ERROR: parquet_path cannot be combined with stream or compact')
+    if (stream or compact is not None or parquet_path is not None) and (item_type or '').lower() not in ITEM_COLUMNS:
+        return consolelog(f'Item type {item_type} is not supported')
+    if stream:
+        return getitembatches(item_type=item_type,conditions=conditions,compact=compact)
+    if parquet_path is not None:
+        return write_itemparquet(item_type=item_type,parquet_path=parquet_path,conditions=conditions)
+    if compact is not None:
+        try:
+            itemtables = list(getitembatches(item_type=item_type,conditions=conditions,compact=compact))
+        except Exception as e:
+            return consolelog(f'Operation failed because {e}')
+        return concat_itemtables(itemtables, item_type)
+
     consolelog(f'Data requested for the tableau server item: {item_type}')
     time.sleep(1)
     itemtable = pd.DataFrame()
@@ -0,0 +1,471 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+import tableau_plumber_client
+from tableau_plumber_client import (consolelog, create_tableau_extract, publish_tableau_data, refresh_tableau_data,
+                                    refresh_tableau_workbook, delete_tableau_data, downloadview)
+
+
+# Actions a manifest step can call and the resource pool each one runs in
+PIPELINE_ACTIONS = {
+    'create_tableau_extract': (create_tableau_extract, 'hyper'),
+    'publish_tableau_data': (publish_tableau_data, 'server'),
+    'refresh_tableau_data': (refresh_tableau_data, 'server'),
+    'refresh_tableau_workbook': (refresh_tableau_workbook, 'server'),
+    'delete_tableau_data': (delete_tableau_data, 'server'),
+    'downloadview': (downloadview, 'server'),
+}
+
+# Hyper builds are local and can run side by side. Every other action signs in and out of the
+# single module-level server session of tableau_plumber_client, and signing out clears the
+# token for everyone, so the server pool is fixed at one step at a time.
+DEFAULT_LIMITS = {'hyper': 2, 'server': 1}
+
+# The client functions log their errors through consolelog and return None instead of raising.
+# A step fails when one of its log messages starts with one of the client's fixed failure messages.
+# Only the start of a message is checked because the rest carries user names, paths and column names
+FAILURE_PREFIXES = ('ERROR:', 'Error:', 'No workbook found', 'No workbooks found', 'No view found',
+                    'No datasources found', 'File Format Not Supported', 'Operation failed because',
+                    'Source refresh failed because', 'Source deletion failed because',
+                    'Data Source publishing failed because', 'New datasource item creation failed')
+
+# Log messages of the step running on the current thread
+step_log = threading.local()
+client_consolelog = None
+
+
+def capture_consolelog(console_string):
+    messages = getattr(step_log, 'messages', None)
+    if messages is not None:
+        messages.append(str(console_string))
+    return client_consolelog(console_string)
+
+
+def install_step_log():
+    """
+    [summary]
+    Internal function that routes the client's consolelog through the step log while a pipeline runs. The client functions look
+    consolelog up in their module at call time, so patching the module attribute is enough.
+
+    Returns:
+        [bool]: True if this call installed the capture and should remove it again with remove_step_log
+    """
+
+    global client_consolelog
+    if tableau_plumber_client.consolelog is capture_consolelog:
+        return False
+    client_consolelog = tableau_plumber_client.consolelog
+    tableau_plumber_client.consolelog = capture_consolelog
+    return True
+
+
+def remove_step_log():
+    tableau_plumber_client.consolelog = client_consolelog
+
+
+def read_manifest(manifest_path):
+    """
+    [summary]
+    Reads a pipeline manifest from a JSON or YAML file. YAML needs the optional 'pyyaml' package
+
+    Args:
+        manifest_path ([string]): Location of the manifest file
+
+    Returns:
+        [dict]: The manifest contents
+    """
+
+    with open(manifest_path) as f:
+        if manifest_path.lower().endswith(('.yml', '.yaml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError('pyyaml is required to read YAML manifests. Install it or use a JSON manifest')
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def validate_steps(steps):
+    """
+    [summary]
+    Internal function that checks the manifest steps and returns them in dependency order. This should not be called outside 'run_pipeline' function
+
+    Args:
+        steps ([list]): List of step dictionaries from the manifest
+
+    Returns:
+        [list]: Step names in an order where every step comes after its dependencies
+    """
+
+    if not isinstance(steps, list):
+        raise ValueError('steps must be a list of steps')
+
+    step_map = {}
+    for step in steps:
+        if not isinstance(step, dict):
+            raise ValueError(f'Every step must be a mapping of step keys, not {step!r}')
+        name = step.get('name')
+        if not isinstance(name, str):
+            raise ValueError('Every step needs a name')
+        if name in step_map:
+            raise ValueError(f'Step {name} is defined more than once')
+        if step.get('action') not in PIPELINE_ACTIONS:
+            raise ValueError(f"Step {name} has an unknown action {step.get('action')}")
+        for key in ('depends_on', 'inputs', 'outputs'):
+            values = step.get(key, [])
+            if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                raise ValueError(f'Step {name} key {key} must be a list of names')
+        if not isinstance(step.get('args', {}), dict):
+            raise ValueError(f'Step {name} args must be a mapping of keyword arguments')
+        try:
+            json.dumps(step.get('args', {}))
+        except (TypeError, ValueError):
+            raise ValueError(f'Step {name} has arguments that are not plain JSON values. Pass file paths instead of dataframes')
+        step_map[name] = step
+
+    for name, step in step_map.items():
+        for dependency in step.get('depends_on', []):
+            if dependency not in step_map:
+                raise ValueError(f'Step {name} depends on the unknown step {dependency}')
+
+    ordered = []
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Dependency cycle found: {' -> '.join(path + [name])}")
+        state[name] = 'visiting'
+        for dependency in step_map[name].get('depends_on', []):
+            visit(dependency, path + [name])
+        state[name] = 'done'
+        ordered.append(name)
+
+    for name in step_map:
+        visit(name, [])
+
+    return ordered
+
+
+def validate_limits(manifest_limits):
+    """
+    [summary]
+    Internal function that merges the manifest limits with DEFAULT_LIMITS. This should not be called outside 'run_pipeline' function
+
+    Args:
+        manifest_limits ([dict]): Pool name to the number of steps that can run at the same time
+
+    Returns:
+        [dict]: The limits of every pool
+    """
+
+    if not isinstance(manifest_limits, dict):
+        raise ValueError('limits must be a mapping of pool names to limits')
+
+    limits = dict(DEFAULT_LIMITS)
+    for pool, limit in manifest_limits.items():
+        if pool not in DEFAULT_LIMITS:
+            raise ValueError(f"Unknown pool {pool}. Pools are {', '.join(DEFAULT_LIMITS)}")
+        if not isinstance(limit, int) or limit < 1:
+            raise ValueError(f'The limit of pool {pool} must be a positive whole number')
+        if pool == 'server' and limit != 1:
+            raise ValueError('The server pool is limited to 1 because the client shares a single signed-in session')
+        limits[pool] = limit
+    return limits
+
+
+def hash_file(file_path):
+    """
+    [summary]
+    Internal function that returns the sha256 digest of a file's contents, or None if the file doesn't exist
+    """
+
+    if not os.path.exists(file_path):
+        return None
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def step_fingerprint(step, dependency_fingerprints):
+    """
+    [summary]
+    Internal function that builds the cache key of a step from its action, arguments, input files and the keys of its dependencies.
+    A change anywhere upstream therefore changes the key of every step below it
+
+    Returns:
+        [string]: Hex digest identifying the step inputs
+    """
+
+    payload = {
+        'action': step['action'],
+        'args': step.get('args', {}),
+        'inputs': {path: hash_file(path) for path in step.get('inputs', [])},
+        'depends_on': dependency_fingerprints,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def cache_enabled(step):
+    return bool(step.get('cache', 'inputs' in step))
+
+
+def is_cached(step, fingerprint, cache):
+    """
+    [summary]
+    Internal function that decides whether a step can be skipped. A step is skipped when caching is on for it,
+    its fingerprint matches the last successful run and all of its declared outputs still exist
+    """
+
+    if not cache_enabled(step):
+        return False
+    if cache.get(step['name']) != fingerprint:
+        return False
+    return all(os.path.exists(path) for path in step.get('outputs', []))
+
+
+def read_cache(cache_path):
+    if cache_path is None or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except Exception as e:
+        consolelog(f'Pipeline cache could not be read because {e}. Running all steps')
+        return {}
+
+
+def write_cache(cache_path, cache):
+    if cache_path is None:
+        return
+    with open(cache_path, 'w') as f:
+        json.dump(cache, f, indent=4, sort_keys=True)
+
+
+def is_failure_message(console_string):
+    return console_string.strip().startswith(FAILURE_PREFIXES)
+
+
+def run_step(step):
+    """
+    [summary]
+    Internal function that calls the client function behind a step and times it. This should not be called outside 'run_pipeline' function.
+    The step fails if the client function raises, logs an error or doesn't write one of the declared outputs
+
+    Returns:
+        [tuple]: Start time, end time and the failure reason, which is None if the step succeeded
+    """
+
+    action = PIPELINE_ACTIONS[step['action']][0]
+    start = datetime.datetime.now()
+    step_log.messages = []
+    try:
+        action(**step.get('args', {}))
+        failure = None
+    except Exception as e:
+        failure = str(e)
+    finally:
+        messages = step_log.messages
+        step_log.messages = None
+    end = datetime.datetime.now()
+    if failure is not None:
+        return (start, end, failure)
+
+    errors = [message for message in messages if is_failure_message(message)]
+    if len(errors) > 0:
+        return (start, end, errors[0].strip())
+
+    # Outputs left over from an earlier run don't count. Two seconds of slack covers coarse file timestamps
+    stale = [path for path in step.get('outputs', [])
+             if not os.path.exists(path) or os.path.getmtime(path) < start.timestamp() - 2]
+    if len(stale) > 0:
+        return (start, end, f"Outputs not written by the step: {', '.join(stale)}")
+    return (start, end, None)
+
+
+def run_pipeline(manifest=None, manifest_path=None, cache_path='.plumber_cache.json', report_path=None, force=False):
+    """
+    [summary]
+    This function runs a pipeline manifest as a dependency graph. Steps whose dependencies have finished run in parallel,
+    limited per resource pool. create_tableau_extract runs in the 'hyper' pool, whose limit can be raised. Every other
+    action talks to the server and runs in the 'server' pool, one step at a time.
+
+    A step fails when its client function raises, logs an error or leaves a declared output unwritten. Steps below a
+    failed step are skipped and only successful steps are stored in the cache.
+
+    Manifest layout:
+
+    {
+        "limits": {"hyper": 4},
+        "steps": [
+            {"name": "build_sales", "action": "create_tableau_extract",
+             "args": {"extract_path": "sales.hyper", "raw_data_path": "sales.csv"},
+             "inputs": ["sales.csv"], "outputs": ["sales.hyper"]},
+            {"name": "publish_sales", "action": "publish_tableau_data", "depends_on": ["build_sales"],
+             "args": {"project_name": "Finance", "extract_file_path": "sales.hyper", "data_source_name": "Sales"},
+             "cache": true},
+            {"name": "refresh_dashboard", "action": "refresh_tableau_workbook", "depends_on": ["publish_sales"],
+             "args": {"workbookname": "Sales Dashboard"}}
+        ]
+    }
+
+    [step keys]
+    name = Unique name of the step
+
+    action = One of create_tableau_extract, publish_tableau_data, refresh_tableau_data, refresh_tableau_workbook, delete_tableau_data or downloadview
+
+    args = Keyword arguments passed to the action. These must be plain JSON values, so extracts are built from raw_data_path rather than raw_data
+
+    depends_on = Names of the steps that must finish first
+
+    inputs = Files the step reads. Declaring inputs turns caching on for the step
+
+    outputs = Files the step writes. The step fails if it doesn't write them and a cached step is re-run if any of them is missing
+
+    cache = Set this to true or false to override the caching decision of the step
+
+    Args:
+        manifest ([dict], optional): The manifest itself. If this is not provided, manifest_path is read. Defaults to None.
+
+        manifest_path ([string], optional): Location of a JSON or YAML manifest. Defaults to None.
+
+        cache_path ([string], optional): Location of the file that stores the fingerprints of successful steps. Set to None to turn caching off. Defaults to '.plumber_cache.json'.
+
+        report_path ([string], optional): If provided, the timing report is also written here as CSV. Defaults to None.
+
+        force ([bool], optional): Run every step even if it is cached. Defaults to False.
+
+    Returns:
+        [Dataframe]: Timing report with one row per step
+    """
+
+    if manifest is None:
+        try:
+            manifest = read_manifest(manifest_path)
+        except Exception as e:
+            return consolelog(f'ERROR: Manifest could not be read because {e}')
+
+    try:
+        if not isinstance(manifest, dict):
+            raise ValueError('The manifest must be a mapping with a steps list')
+        order = validate_steps(manifest.get('steps', []))
+        limits = validate_limits(manifest.get('limits', {}))
+    except ValueError as e:
+        return consolelog(f'ERROR: Invalid manifest. {e}')
+
+    steps = {step['name']: dict(step) for step in manifest.get('steps', [])}
+    for name in order:
+        steps[name]['pool'] = PIPELINE_ACTIONS[steps[name]['action']][1]
+
+    cache = {} if cache_path is None else read_cache(cache_path)
+    fingerprints = {}
+    status = {}
+    timings = {}
+    running = {}
+    pool_usage = {pool: 0 for pool in limits}
+    pipeline_start = time.perf_counter()
+
+    consolelog(f'Running pipeline with {len(order)} steps...')
+    installed = install_step_log()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, sum(limits.values()))) as executor:
+            while len(status) < len(order):
+                for name in order:
+                    step = steps[name]
+                    if name in status or name in running.values():
+                        continue
+                    dependencies = step.get('depends_on', [])
+                    if any(status.get(dependency) in ('failed', 'blocked') for dependency in dependencies):
+                        status[name] = 'blocked'
+                        consolelog(f'Step {name} skipped because a dependency failed')
+                        continue
+                    if not all(status.get(dependency) in ('done', 'cached') for dependency in dependencies):
+                        continue
+
+                    fingerprints[name] = step_fingerprint(step, [fingerprints[dependency] for dependency in dependencies])
+                    # An upstream step without caching always re-runs, so its dependents cannot trust their fingerprint
+                    upstream_ran = any(status[dependency] == 'done' and not cache_enabled(steps[dependency])
+                                       for dependency in dependencies)
+                    if not force and not upstream_ran and is_cached(step, fingerprints[name], cache):
+                        status[name] = 'cached'
+                        consolelog(f'Step {name} is up to date. Skipping...')
+                        continue
+
+                    if pool_usage[step['pool']] >= limits[step['pool']]:
+                        continue
+                    pool_usage[step['pool']] += 1
+                    consolelog(f"Starting step {name} ({step['action']}) in pool {step['pool']}")
+                    running[executor.submit(run_step, step)] = name
+
+                if not running:
+                    continue
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    pool_usage[steps[name]['pool']] -= 1
+                    try:
+                        start, end, failure = future.result()
+                    except Exception as e:
+                        status[name] = 'failed'
+                        consolelog(f'Step {name} failed because {e}')
+                        continue
+                    timings[name] = (start, end)
+                    if failure is not None:
+                        status[name] = 'failed'
+                        consolelog(f'Step {name} failed after {(end - start).total_seconds():.2f} seconds because {failure}')
+                        continue
+                    status[name] = 'done'
+                    consolelog(f'Step {name} completed in {(end - start).total_seconds():.2f} seconds')
+                    if cache_enabled(steps[name]) and cache_path is not None:
+                        cache[name] = fingerprints[name]
+                        write_cache(cache_path, cache)
+    finally:
+        if installed:
+            remove_step_log()
+
+    report_rows = []
+    for name in order:
+        start, end = timings.get(name, (None, None))
+        seconds = (end - start).total_seconds() if start is not None else 0.0
+        report_rows.append((name, steps[name]['action'], steps[name]['pool'], status[name], start, end, seconds))
+    report = pd.DataFrame(report_rows, columns=['Step', 'Action', 'Pool', 'Status', 'Start Time', 'End Time', 'Seconds'])
+
+    consolelog(f'Pipeline completed in {time.perf_counter() - pipeline_start:.2f} seconds\n{report.to_string(index=False)}')
+    if report_path is not None:
+        report.to_csv(report_path, index=False)
+        consolelog(f'Timing report written to {report_path}')
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a Tableau Express Plumber pipeline manifest')
+    parser.add_argument('manifest_path', help='JSON or YAML pipeline manifest')
+    parser.add_argument('--cache-path', default='.plumber_cache.json', help='File storing fingerprints of successful steps')
+    parser.add_argument('--no-cache', action='store_true', help='Turn step caching off for this run')
+    parser.add_argument('--force', action='store_true', help='Run every step even if its inputs have not changed')
+    parser.add_argument('--report-path', default=None, help='Write the timing report to this CSV file')
+    args = parser.parse_args(argv)
+
+    report = run_pipeline(manifest_path=args.manifest_path,
+                          cache_path=None if args.no_cache else args.cache_path,
+                          report_path=args.report_path,
+                          force=args.force)
+    if report is None or (report['Status'].isin(['failed', 'blocked'])).any():
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,165 @@
+import importlib.util
+import os
+import sys
+import time
+import types
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def client():
+    # The client signs in when it is imported, so the server libraries are replaced with mocks
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setitem(sys.modules, 'tableauserverclient', MagicMock())
+        mp.setitem(sys.modules, 'tableauserverclient.models', MagicMock())
+        mp.setitem(sys.modules, 'tableauhyperapi', MagicMock())
+        mp.setattr(time, 'sleep', lambda seconds: None)
+        mp.chdir(ROOT)
+        spec = importlib.util.spec_from_file_location('tableau_plumber_client', os.path.join(ROOT, 'tableau_plumber_client.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        yield module
+
+
+def view_page(client, names, workbook_id):
+    items = [types.SimpleNamespace(name=name, id=f'{name}-id', workbook_id=workbook_id) for name in names]
+    return client.getviewdata(items)
+
+
+def view_pages(*pages, total=None, fail_after=None):
+    total = total if total is not None else sum(len(page) for page in pages)
+    responses = [(page, types.SimpleNamespace(total_available=total)) for page in pages]
+
+    def get(conditions):
+        if fail_after is not None and conditions.pagenumber > fail_after:
+            raise RuntimeError('page request failed')
+        return responses[conditions.pagenumber - 1]
+    return get
+
+
+def view_items(*names):
+    return [types.SimpleNamespace(name=name, id=f'{name}-id', workbook_id='wb-1') for name in names]
+
+
+def test_concat_keeps_categoricals_across_pages(client):
+    first = client.compact_itemtable(view_page(client, ['a', 'b'], 'wb-1'), 'view')
+    second = client.compact_itemtable(view_page(client, ['c'], 'wb-2'), 'view')
+    itemtable = client.concat_itemtables([first, second], 'view')
+
+    assert isinstance(itemtable['Workbook ID'].dtype, pd.CategoricalDtype)
+    assert set(itemtable['Workbook ID'].cat.categories) == {'wb-1', 'wb-2'}
+    assert itemtable['Workbook ID'].tolist() == ['wb-1', 'wb-1', 'wb-2']
+    assert itemtable['Item Name'].tolist() == ['a', 'b', 'c']
+
+
+def test_all_nat_date_page(client):
+    items = [types.SimpleNamespace(name='a', id='a-id', created_at=None, updated_at=None, project_name='Finance')]
+    empty_dates = client.compact_itemtable(client.getdatasourcedata(items), 'datasource')
+    assert str(empty_dates['Creation Date'].dtype).startswith('datetime64')
+    assert empty_dates['Creation Date'].isna().all()
+
+    items = [types.SimpleNamespace(name='b', id='b-id', created_at='2021-03-01T10:00:00Z',
+                                   updated_at='2021-03-02T10:00:00Z', project_name='Sales')]
+    dated = client.compact_itemtable(client.getdatasourcedata(items), 'datasource')
+    itemtable = client.concat_itemtables([empty_dates, dated], 'datasource')
+
+    assert str(itemtable['Update Date'].dtype).startswith('datetime64')
+    assert str(itemtable['Update Date'].dt.tz) == 'UTC'
+    assert itemtable['Update Date'].isna().tolist() == [True, False]
+    assert isinstance(itemtable['Project Name'].dtype, pd.CategoricalDtype)
+
+
+def test_workbook_page_with_no_rows(client):
+    empty = client.compact_itemtable(client.getworkbookdata([]), 'workbook')
+    assert len(empty) == 0
+
+    views = [types.SimpleNamespace(name='Sheet 1', id='v-1')]
+    workbook = types.SimpleNamespace(name='Sales', id='wb-1', views=views)
+    filled = client.compact_itemtable(client.getworkbookdata([workbook]), 'workbook')
+    itemtable = client.concat_itemtables([empty, filled, empty], 'workbook')
+
+    assert itemtable['View ID'].tolist() == ['v-1']
+    assert isinstance(itemtable['Item Name'].dtype, pd.CategoricalDtype)
+    assert len(client.concat_itemtables([empty], 'workbook')) == 0
+
+
+def test_concat_of_no_pages_has_declared_columns(client):
+    itemtable = client.concat_itemtables([], 'datasource')
+    assert len(itemtable) == 0
+    assert itemtable.columns.tolist() == client.ITEM_COLUMNS['datasource']['columns']
+
+
+def test_arrow_compact(client):
+    itemtable = client.compact_itemtable(view_page(client, ['a'], 'wb-1'), 'view', compact='arrow')
+    assert all(str(dtype) == 'string' for dtype in itemtable.dtypes)
+    assert itemtable['Item Name'].array.__class__.__name__ == 'ArrowStringArray'
+
+
+def test_unknown_compact_mode(client):
+    with pytest.raises(ValueError):
+        client.compact_itemtable(view_page(client, ['a'], 'wb-1'), 'view', compact='Arrow')
+    with pytest.raises(ValueError):
+        client.getitembatches(item_type='view', compact='categorical')
+    assert client.getitemdetails(item_type='view', compact='categorical') is None
+
+
+def test_stream_signs_in_for_every_page(client, monkeypatch):
+    monkeypatch.setattr(client.server.views, 'get', view_pages(view_items('a', 'b'), view_items('c')))
+    client.server.auth.sign_in.reset_mock()
+    conditions = types.SimpleNamespace(pagenumber=1, pagesize=2)
+
+    pages = list(client.getitemdetails(item_type='view', conditions=conditions, stream=True))
+    assert [len(page) for page in pages] == [2, 1]
+    assert client.server.auth.sign_in.call_count == 2
+
+
+def test_failed_page_is_not_a_partial_result(client, monkeypatch, tmp_path):
+    get = view_pages(view_items('a', 'b'), view_items('c'), fail_after=1)
+    monkeypatch.setattr(client.server.views, 'get', get)
+    conditions = types.SimpleNamespace(pagenumber=1, pagesize=2)
+
+    assert client.getitemdetails(item_type='view', conditions=conditions, compact='category') is None
+
+    parquet_path = str(tmp_path / 'views.parquet')
+    assert client.getitemdetails(item_type='view', conditions=conditions, parquet_path=parquet_path) is None
+    assert not os.path.exists(parquet_path)
+
+    with pytest.raises(RuntimeError):
+        list(client.getitemdetails(item_type='view', conditions=conditions, stream=True))
+
+
+def test_parquet_export(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(client.server.views, 'get', view_pages(view_items('a', 'b'), view_items('c')))
+    conditions = types.SimpleNamespace(pagenumber=1, pagesize=2)
+    parquet_path = str(tmp_path / 'views.parquet')
+
+    assert client.getitemdetails(item_type='view', conditions=conditions, parquet_path=parquet_path) == 3
+    assert pd.read_parquet(parquet_path)['Item Name'].tolist() == ['a', 'b', 'c']
+
+
+def test_server_capped_page_size_reads_every_page(client, monkeypatch):
+    # 2000 items per page were requested but the server only returns 2
+    get = view_pages(view_items('a', 'b'), view_items('c', 'd'), view_items('e'))
+    monkeypatch.setattr(client.server.views, 'get', get)
+    conditions = types.SimpleNamespace(pagenumber=1, pagesize=2000)
+
+    itemtable = client.getitemdetails(item_type='view', conditions=conditions, compact='category')
+    assert itemtable['Item Name'].tolist() == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_conflicting_options_are_rejected(client, tmp_path):
+    parquet_path = str(tmp_path / 'views.parquet')
+    assert client.getitemdetails(item_type='view', stream=True, parquet_path=parquet_path) is None
+    assert client.getitemdetails(item_type='view', compact='arrow', parquet_path=parquet_path) is None
+    assert not os.path.exists(parquet_path)
+
+
+def test_unsupported_item_type_with_options(client, tmp_path):
+    assert client.getitemdetails(item_type='flow', stream=True) is None
+    assert client.getitemdetails(item_type='flow', compact='category') is None
+    assert client.getitemdetails(item_type='flow', parquet_path=str(tmp_path / 'flows.parquet')) is None
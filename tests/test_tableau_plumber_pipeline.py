@@ -0,0 +1,230 @@
+import importlib.util
+import os
+import sys
+import threading
+import time
+import types
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stand-in for tableau_plumber_client. Like the real client it logs errors through consolelog and returns None
+STUB_CLIENT = '''
+import threading
+import time
+
+calls = []
+active = []
+peak = [0]
+lock = threading.Lock()
+
+def consolelog(console_string):
+    print(console_string)
+
+def track(name):
+    with lock:
+        calls.append(name)
+        active.append(name)
+        peak[0] = max(peak[0], len(active))
+    time.sleep(0.05)
+    with lock:
+        active.remove(name)
+
+def create_tableau_extract(extract_path, raw_data_path=None, raw_data=None, custom_schema=False, schema_path=None):
+    track('build')
+    with open(extract_path, 'w') as f:
+        f.write(open(raw_data_path).read())
+    return consolelog('Extract file has been generated with 1 rows')
+
+def publish_tableau_data(project_name, extract_file_path, data_source_name=None, write_mode='CreateNew'):
+    track('publish')
+    if project_name == 'missing':
+        return consolelog('Data Source publishing failed because project not found')
+    return consolelog('Data Source has been successfully published')
+
+def refresh_tableau_workbook(workbookname):
+    track('refresh')
+    return consolelog(f'Workbook: {workbookname.upper()} has been refreshed')
+
+def refresh_tableau_data(source_name):
+    track('refresh_data')
+    return consolelog('No datasources found. Please enter a valid source name')
+
+def delete_tableau_data(source_name):
+    track('delete')
+    return consolelog('Data source has been deleted successfully')
+
+def downloadview(workbookname, viewname=None, filepath=None, fileformat=None):
+    track('download')
+    consolelog(f'Downloading {workbookname}.{fileformat}')
+'''
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path):
+    client = types.ModuleType('tableau_plumber_client')
+    exec(STUB_CLIENT, client.__dict__)
+    monkeypatch.setitem(sys.modules, 'tableau_plumber_client', client)
+    spec = importlib.util.spec_from_file_location('tableau_plumber_pipeline', os.path.join(ROOT, 'tableau_plumber_pipeline.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.chdir(tmp_path)
+    module.client = client
+    return module
+
+
+def build_manifest(project_name='Finance'):
+    with open('sales.csv', 'w') as f:
+        f.write('a\n1\n')
+    return {'steps': [
+        {'name': 'build', 'action': 'create_tableau_extract',
+         'args': {'extract_path': 'sales.hyper', 'raw_data_path': 'sales.csv'},
+         'inputs': ['sales.csv'], 'outputs': ['sales.hyper']},
+        {'name': 'publish', 'action': 'publish_tableau_data', 'depends_on': ['build'], 'cache': True,
+         'args': {'project_name': project_name, 'extract_file_path': 'sales.hyper'}},
+        {'name': 'refresh', 'action': 'refresh_tableau_workbook', 'depends_on': ['publish'],
+         'args': {'workbookname': 'Sales'}},
+    ]}
+
+
+def statuses(report):
+    return dict(zip(report['Step'], report['Status']))
+
+
+def test_validate_steps_orders_dependencies(pipeline):
+    steps = [{'name': 'b', 'action': 'downloadview', 'depends_on': ['a']},
+             {'name': 'a', 'action': 'create_tableau_extract'}]
+    assert pipeline.validate_steps(steps) == ['a', 'b']
+
+
+def test_validate_steps_rejects_cycle(pipeline):
+    steps = [{'name': 'a', 'action': 'downloadview', 'depends_on': ['b']},
+             {'name': 'b', 'action': 'downloadview', 'depends_on': ['a']}]
+    with pytest.raises(ValueError, match='cycle'):
+        pipeline.validate_steps(steps)
+
+
+def test_validate_steps_rejects_unknown_dependency(pipeline):
+    with pytest.raises(ValueError, match='unknown step'):
+        pipeline.validate_steps([{'name': 'a', 'action': 'downloadview', 'depends_on': ['missing']}])
+
+
+def test_validate_steps_rejects_dataframe_args(pipeline):
+    step = {'name': 'a', 'action': 'create_tableau_extract',
+            'args': {'extract_path': 'a.hyper', 'raw_data': pd.DataFrame({'a': [1]})}}
+    with pytest.raises(ValueError, match='JSON'):
+        pipeline.validate_steps([step])
+
+
+def test_validate_limits_keeps_server_pool_at_one(pipeline):
+    assert pipeline.validate_limits({'hyper': 4}) == {'hyper': 4, 'server': 1}
+    with pytest.raises(ValueError, match='server pool'):
+        pipeline.validate_limits({'server': 2})
+    with pytest.raises(ValueError, match='Unknown pool'):
+        pipeline.validate_limits({'upload': 2})
+
+
+def test_fingerprint_follows_inputs_and_upstream(pipeline):
+    with open('sales.csv', 'w') as f:
+        f.write('a\n1\n')
+    step = {'name': 'build', 'action': 'create_tableau_extract', 'args': {}, 'inputs': ['sales.csv']}
+    first = pipeline.step_fingerprint(step, [])
+    assert pipeline.step_fingerprint(step, []) == first
+    assert pipeline.step_fingerprint(step, ['upstream']) != first
+    with open('sales.csv', 'w') as f:
+        f.write('a\n2\n')
+    assert pipeline.step_fingerprint(step, []) != first
+
+
+def test_is_cached_needs_outputs(pipeline):
+    step = {'name': 'build', 'action': 'create_tableau_extract', 'inputs': [], 'outputs': ['sales.hyper']}
+    assert not pipeline.is_cached(step, 'key', {'build': 'key'})
+    open('sales.hyper', 'w').close()
+    assert pipeline.is_cached(step, 'key', {'build': 'key'})
+    assert not pipeline.is_cached(step, 'other', {'build': 'key'})
+
+
+def test_unchanged_steps_are_cached(pipeline):
+    manifest = build_manifest()
+    assert set(statuses(pipeline.run_pipeline(manifest=manifest)).values()) == {'done'}
+    pipeline.client.calls.clear()
+
+    report = pipeline.run_pipeline(manifest=manifest)
+    assert statuses(report) == {'build': 'cached', 'publish': 'cached', 'refresh': 'done'}
+    assert pipeline.client.calls == ['refresh']
+
+
+def test_logged_failure_fails_step_and_blocks_dependents(pipeline):
+    manifest = build_manifest(project_name='missing')
+    report = pipeline.run_pipeline(manifest=manifest)
+    assert statuses(report) == {'build': 'done', 'publish': 'failed', 'refresh': 'blocked'}
+    assert 'refresh' not in pipeline.client.calls
+
+    pipeline.client.calls.clear()
+    report = pipeline.run_pipeline(manifest=manifest)
+    assert statuses(report)['publish'] == 'failed'
+    assert pipeline.client.calls == ['publish']
+
+
+def test_missing_output_fails_step(pipeline):
+    manifest = {'steps': [{'name': 'download', 'action': 'downloadview', 'outputs': ['view.png'],
+                           'args': {'workbookname': 'Sales', 'fileformat': 'image'}}]}
+    assert statuses(pipeline.run_pipeline(manifest=manifest)) == {'download': 'failed'}
+
+
+def test_server_steps_run_one_at_a_time(pipeline):
+    manifest = {'steps': [
+        {'name': 'publish', 'action': 'publish_tableau_data', 'args': {'project_name': 'a', 'extract_file_path': 'a'}},
+        {'name': 'delete', 'action': 'delete_tableau_data', 'args': {'source_name': 'b'}},
+        {'name': 'refresh', 'action': 'refresh_tableau_workbook', 'args': {'workbookname': 'c'}},
+        {'name': 'download', 'action': 'downloadview', 'args': {'workbookname': 'd'}},
+    ]}
+    report = pipeline.run_pipeline(manifest=manifest, cache_path=None)
+    assert set(statuses(report).values()) == {'done'}
+    assert pipeline.client.peak[0] == 1
+
+
+def test_names_with_failure_words_do_not_fail_steps(pipeline):
+    manifest = {'steps': [
+        {'name': 'refresh', 'action': 'refresh_tableau_workbook', 'args': {'workbookname': 'Failed Payments'}},
+        {'name': 'download', 'action': 'downloadview', 'depends_on': ['refresh'],
+         'args': {'workbookname': 'Error Log: no view found'}},
+    ]}
+    report = pipeline.run_pipeline(manifest=manifest, cache_path=None)
+    assert statuses(report) == {'refresh': 'done', 'download': 'done'}
+
+
+def test_failure_messages_are_matched_at_the_start(pipeline):
+    assert pipeline.is_failure_message('ERROR: No project found')
+    assert pipeline.is_failure_message('Source refresh failed because timeout')
+    assert not pipeline.is_failure_message('Column: [error_count] with datatype ~int64~ converted to INT')
+    assert not pipeline.is_failure_message('Workbook: FAILED PAYMENTS has been refreshed')
+
+
+def test_consolelog_is_only_captured_during_a_run(pipeline):
+    original = pipeline.client.consolelog
+    assert pipeline.tableau_plumber_client.consolelog is original
+    pipeline.run_pipeline(manifest=build_manifest(), cache_path=None)
+    assert pipeline.client.consolelog is original
+
+
+def test_failed_step_keeps_its_timing(pipeline):
+    report = pipeline.run_pipeline(manifest=build_manifest(project_name='missing'), cache_path=None)
+    publish = report.set_index('Step').loc['publish']
+    assert publish['Status'] == 'failed'
+    assert publish['Start Time'] is not None
+    assert publish['Seconds'] > 0
+
+
+@pytest.mark.parametrize('manifest', [
+    ['not', 'a', 'mapping'],
+    {'steps': 'build'},
+    {'steps': ['build']},
+    {'steps': [{'name': 'a', 'action': 'downloadview', 'depends_on': 'build'}]},
+    {'steps': [{'name': 'a', 'action': 'downloadview', 'args': ['Sales']}]},
+    {'steps': [], 'limits': [2]},
+])
+def test_malformed_manifest_is_invalid(pipeline, manifest):
+    assert pipeline.run_pipeline(manifest=manifest, cache_path=None) is None